@@ -1 +1,1933 @@
-�jh��-�榖+
\ No newline at end of file
+"""FastAPI backend for CivicRAG.
+
+Mirrors the prototype logic in the frontend services:
+  * /recommend  -- vector RAG over ingested scheme chunks (SBERT + Chroma + LLM)
+  * /retrieve   -- strict rule-based matching over the curated SCHEMES list
+  * /synthesize -- Gemini synthesis of the matched schemes (see geminiService.ts)
+
+The strict path keeps the same scheme data and eligibility rules as
+services/ragService.ts so the frontend can swap between the local
+simulation and this backend without behaviour changes.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import dataclasses
+import functools
+import hashlib
+import json
+import math
+import operator
+import os
+import sqlite3
+import sys
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple, TypedDict
+
+# Right-size the BLAS/OpenMP pool before anything imports torch: with
+# WEB_CONCURRENCY uvicorn processes on one box (the same env var
+# __main__ passes to uvicorn), each gets its share of the cores instead
+# of all of them fighting over the full set.
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", "4"))
+_N_THREADS = max(1, (os.cpu_count() or 1) // max(1, WORKERS))
+os.environ.setdefault("OMP_NUM_THREADS", str(_N_THREADS))
+
+import httpx
+import msgspec
+import numpy as np
+import orjson
+import torch
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
+from sentence_transformers import SentenceTransformer
+from sse_starlette.sse import EventSourceResponse
+from usearch.index import Index
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+EMBED_MODEL_NAME = os.environ.get("EMBED_MODEL", "all-MiniLM-L6-v2")
+TOP_K = int(os.environ.get("TOP_K", "5"))
+MAX_SNIPPET_CHARS = 320
+
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_BASE_URL = os.environ.get(
+    "GEMINI_BASE_URL", "https://generativelanguage.googleapis.com"
+)
+PORT = int(os.environ.get("PORT", "8000"))
+
+torch.set_num_threads(_N_THREADS)
+torch.set_num_interop_threads(1)
+
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", "onnx_minilm")
+
+
+class _OnnxEncoder:
+    """Drop-in ``encode()`` shim backed by ONNX Runtime.
+
+    Export the model once with::
+
+        optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 onnx_minilm/
+
+    and optionally quantize it to int8 (saved as ``model_quantized.onnx``).
+    ONNX Runtime fuses ops and skips the Python-level PyTorch dispatch;
+    int8 halves memory bandwidth on VNNI-capable CPUs. Output
+    dimensionality matches the PyTorch model, so the existing Chroma
+    collection stays valid.
+    """
+
+    def __init__(self, model_dir: str) -> None:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        sess_options = onnxruntime.SessionOptions()
+        sess_options.intra_op_num_threads = os.cpu_count() or 1
+        quantized = os.path.join(model_dir, "model_quantized.onnx")
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_dir,
+            file_name="model_quantized.onnx" if os.path.exists(quantized) else None,
+            provider="CPUExecutionProvider",
+            session_options=sess_options,
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts, padding=True, truncation=True, return_tensors="np"
+        )
+        hidden = self.model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"][..., None].astype(hidden.dtype)
+        # Mean pooling over non-padding tokens, as SentenceTransformer does.
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled.astype(np.float32)
+
+
+class _TorchEncoder:
+    """encode() shim that skips autograd bookkeeping on the forward pass."""
+
+    def __init__(self, model) -> None:
+        model.eval()
+        self.model = model
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        with torch.inference_mode():
+            return self.model.encode(texts)
+
+
+def _load_embed_model():
+    """Prefer the exported ONNX graph; fall back to the PyTorch model."""
+    if os.path.isdir(ONNX_MODEL_DIR):
+        try:
+            return _OnnxEncoder(ONNX_MODEL_DIR)
+        except Exception as exc:
+            # The export dir exists, so someone opted into the ONNX
+            # backend — a broken export or missing optimum/onnxruntime
+            # should be loud, not a silent FP32 downgrade.
+            print(
+                f"WARNING: ONNX embedder in {ONNX_MODEL_DIR!r} failed to load "
+                f"({exc!r}); falling back to the PyTorch model",
+                file=sys.stderr,
+            )
+    return _TorchEncoder(SentenceTransformer(EMBED_MODEL_NAME))
+
+
+embed_model = _load_embed_model()
+
+# Shared async HTTP client so concurrent LLM calls overlap their latency
+# instead of serializing on the event loop, and so TCP/TLS connections are
+# reused across requests.
+http_client = httpx.AsyncClient(
+    timeout=30,
+    limits=httpx.Limits(
+        max_connections=100,
+        max_keepalive_connections=20,
+        keepalive_expiry=60.0,
+    ),
+)
+
+# Vector store: an HNSW index (log-N graph traversal, SIMD distance
+# kernels) persisted next to the app, with chunk metadata in a SQLite
+# sidecar keyed by row id. Replaces the former brute-force Chroma
+# duckdb+parquet collection.
+EMBED_DIM = 384
+VEC_INDEX_PATH = os.environ.get("VEC_INDEX_PATH", "schemes.usearch")
+VEC_META_DB = os.environ.get("VEC_META_DB", "scheme_meta.db")
+
+vec_index = Index(ndim=EMBED_DIM, metric="cos", connectivity=16, expansion_add=64)
+if os.path.exists(VEC_INDEX_PATH):
+    vec_index.load(VEC_INDEX_PATH)
+# Recall/latency knob (HNSW ef_search).
+vec_index.expansion_search = int(os.environ.get("VEC_EF_SEARCH", "64"))
+
+meta_db = sqlite3.connect(VEC_META_DB, check_same_thread=False)
+meta_db.execute(
+    "CREATE TABLE IF NOT EXISTS metadata("
+    "row_id INTEGER PRIMARY KEY, scheme_id TEXT, title TEXT, "
+    "source_url TEXT, page_no INTEGER, jurisdiction TEXT, doc_text TEXT)"
+)
+meta_db.execute(
+    "CREATE INDEX IF NOT EXISTS metadata_jurisdiction ON metadata(jurisdiction)"
+)
+_meta_db_lock = threading.Lock()
+
+# Flat row-major copy of every stored vector (row id == row offset).
+# When a metadata filter cuts the candidate set down to a few thousand
+# rows, brute-force cosine over this contiguous block (SIMD kernels via
+# usearch's exact search) beats an HNSW query plus post-filtering.
+# Stored float16: halves memory bandwidth; only the small candidate
+# batch is cast up to float32 at rerank time.
+VEC_MEMMAP_PATH = os.environ.get("VEC_MEMMAP_PATH", "vecs.f16")
+
+
+def _stored_vectors() -> Optional[np.ndarray]:
+    if not os.path.exists(VEC_MEMMAP_PATH):
+        return None
+    n = os.path.getsize(VEC_MEMMAP_PATH) // (2 * EMBED_DIM)
+    if n == 0:
+        return None
+    return np.memmap(VEC_MEMMAP_PATH, dtype=np.float16, mode="r", shape=(n, EMBED_DIM))
+
+
+def _exact_rerank(q_emb: np.ndarray, row_ids: List[int], k: int):
+    """Exact cosine top-k over the candidate rows.
+
+    Returns (row_id, score) pairs, best first. Vectors are unit-normalized
+    at ingest, so the NumPy fallback is a plain dot product.
+    """
+    vecs = _stored_vectors()
+    if vecs is None:
+        return []
+    ids = np.asarray([rid for rid in row_ids if 0 <= rid < len(vecs)], dtype=np.int64)
+    if ids.size == 0:
+        return []
+    cand = np.ascontiguousarray(vecs[ids], dtype=np.float32)
+    count = min(k, len(ids))
+    try:
+        from usearch.index import MetricKind
+        from usearch.index import search as usearch_exact_search
+
+        matches = usearch_exact_search(
+            cand, q_emb, count, metric=MetricKind.Cos, exact=True
+        )
+        order = np.asarray(matches.keys, dtype=np.int64)
+        scores = 1.0 - np.asarray(matches.distances, dtype=np.float32)
+    except Exception:
+        sims = cand @ q_emb
+        order = np.argsort(-sims)[:count]
+        scores = sims[order]
+    return [(int(ids[i]), float(s)) for i, s in zip(order, scores)]
+
+# Bounded pool for CPU/IO-blocking calls (embedding, index search,
+# SQLite) so they never stall the event loop.
+EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count())
+
+app = FastAPI(title="CivicRAG API", default_response_class=ORJSONResponse)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+# ---------------------------------------------------------------------------
+# Vector RAG path (/recommend)
+# ---------------------------------------------------------------------------
+
+class Profile(BaseModel):
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    state: Optional[str] = None
+    occupation: Optional[str] = None
+    annual_income: Optional[float] = None
+    text: Optional[str] = None  # free-form query, bypasses the profile template
+
+
+class RecommendationSnippet(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    scheme_id: Optional[str] = None
+    title: Optional[str] = None
+    text: str
+    source_url: Optional[str] = None
+    page_no: Optional[int] = None
+    score: float = 0.0
+
+
+class Recommendation(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    scheme_id: Optional[str] = None
+    title: str
+    reason: str
+    confidence: float = 0.0
+    snippets: List[RecommendationSnippet] = []
+
+
+class RecommendResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    summary: str
+    recommendations: List[Recommendation] = []
+
+
+@dataclasses.dataclass(slots=True)
+class Snippet:
+    """Ephemeral retrieval result; slotted to keep the hot loop cheap."""
+
+    scheme_id: Optional[str]
+    title: Optional[str]
+    text: str
+    source_url: Optional[str]
+    page_no: Optional[int]
+    score: float
+
+
+def ingest_chunks(chunks: List[Dict[str, Any]]) -> int:
+    """Embed and store document chunks.
+
+    Each chunk is a dict with ``doc_text`` plus metadata columns
+    (``scheme_id``, ``title``, ``source_url``, ``page_no``, ``jurisdiction``).
+    Vectors go into the HNSW index; metadata goes into the SQLite sidecar
+    under the same row ids.
+    """
+    docs = [c["doc_text"] for c in chunks]
+    embeddings = encode_batch(docs)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    embeddings = embeddings / norms
+    with _meta_db_lock:
+        next_id = (
+            meta_db.execute("SELECT COALESCE(MAX(row_id), -1) FROM metadata").fetchone()[0]
+            + 1
+        )
+        row_ids = np.arange(next_id, next_id + len(chunks), dtype=np.int64)
+        meta_db.executemany(
+            "INSERT INTO metadata(row_id, scheme_id, title, source_url, "
+            "page_no, jurisdiction, doc_text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    int(rid),
+                    c.get("scheme_id"),
+                    c.get("title"),
+                    c.get("source_url"),
+                    c.get("page_no"),
+                    c.get("jurisdiction"),
+                    c["doc_text"],
+                )
+                for rid, c in zip(row_ids, chunks)
+            ],
+        )
+        meta_db.commit()
+    vec_index.add(row_ids, embeddings)
+    vec_index.save(VEC_INDEX_PATH)
+    with open(VEC_MEMMAP_PATH, "ab") as f:
+        f.write(embeddings.astype(np.float16).tobytes())
+    return len(docs)
+
+
+# Two-tier query cache: exact-match LRU over query strings, plus a ring
+# buffer of recent (embedding, snippets) pairs so near-identical profile
+# queries (same state/occupation phrased slightly differently) skip both
+# the SBERT forward pass and the vector-store query.
+_EMB_CACHE_MAX = 2048
+_SEMANTIC_CACHE_THRESHOLD = 0.97
+_emb_cache: "collections.OrderedDict[str, np.ndarray]" = collections.OrderedDict()
+_recent_queries: collections.deque = collections.deque(maxlen=256)
+_cache_lock = threading.Lock()
+
+# Persistent tier below the in-memory LRU: survives restarts, so warm
+# queries skip the transformer on cold start. Keys include the model name
+# so switching embedding models invalidates cleanly; vectors are stored
+# float16 to halve disk bytes.
+EMB_CACHE_DB = os.environ.get("EMB_CACHE_DB", "emb_cache.db")
+emb_db = sqlite3.connect(EMB_CACHE_DB, check_same_thread=False)
+emb_db.execute("CREATE TABLE IF NOT EXISTS emb(key BLOB PRIMARY KEY, vec BLOB)")
+_emb_db_lock = threading.Lock()
+
+
+def _disk_cache_key(query: str) -> bytes:
+    return hashlib.sha256((EMBED_MODEL_NAME + "|" + query).encode()).digest()
+
+
+def _disk_cache_get(query: str) -> Optional[np.ndarray]:
+    with _emb_db_lock:
+        row = emb_db.execute(
+            "SELECT vec FROM emb WHERE key = ?", (_disk_cache_key(query),)
+        ).fetchone()
+    if row is None:
+        return None
+    return np.frombuffer(row[0], dtype=np.float16).astype(np.float32)
+
+
+def _disk_cache_put(query: str, emb: np.ndarray) -> None:
+    with _emb_db_lock:
+        emb_db.execute(
+            "INSERT OR REPLACE INTO emb(key, vec) VALUES (?, ?)",
+            (_disk_cache_key(query), emb.astype(np.float16).tobytes()),
+        )
+        emb_db.commit()
+
+
+def encode_batch(texts: List[str]) -> np.ndarray:
+    """Encode many texts with smart batching.
+
+    Sorting by length keeps padding local to similarly-sized neighbours,
+    then the original order is restored.
+    """
+    idx = np.argsort([len(t) for t in texts])
+    embs = np.asarray(embed_model.encode([texts[i] for i in idx]), dtype=np.float32)
+    out = np.empty_like(embs)
+    out[idx] = embs
+    return out
+
+
+def _store_embedding(query: str, emb: np.ndarray) -> np.ndarray:
+    """L2-normalize and insert into the LRU, evicting the oldest entry."""
+    norm = np.linalg.norm(emb)
+    if norm > 0:
+        emb = emb / norm
+    with _cache_lock:
+        _emb_cache[query] = emb
+        while len(_emb_cache) > _EMB_CACHE_MAX:
+            _emb_cache.popitem(last=False)
+    return emb
+
+
+# Micro-batching: concurrent requests enqueue their query and await a
+# Future; a background task drains the queue every ~10 ms and encodes the
+# whole batch in one forward pass, amortizing the per-call PyTorch
+# overhead that dominates single-sentence encoding.
+_EMBED_BATCH_WINDOW_S = 0.01
+_pending_embeds: List[Any] = []
+
+
+async def get_embedding(query: str) -> np.ndarray:
+    """Return the (normalized) embedding, batching concurrent encodes."""
+    with _cache_lock:
+        cached = _emb_cache.get(query)
+        if cached is not None:
+            _emb_cache.move_to_end(query)
+            return cached
+    loop = asyncio.get_running_loop()
+    # SQLite read goes through EXECUTOR like all blocking I/O here.
+    disk = await loop.run_in_executor(EXECUTOR, _disk_cache_get, query)
+    if disk is not None:
+        return _store_embedding(query, disk)
+    fut = loop.create_future()
+    _pending_embeds.append((query, fut))
+    return await fut
+
+
+async def _embedding_batcher() -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(_EMBED_BATCH_WINDOW_S)
+        if not _pending_embeds:
+            continue
+        batch = _pending_embeds[:]
+        del _pending_embeds[: len(batch)]
+        try:
+            embs = await loop.run_in_executor(
+                EXECUTOR, encode_batch, [q for q, _ in batch]
+            )
+        except Exception as exc:  # pragma: no cover - model failure
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+            continue
+        for (query, fut), emb in zip(batch, embs):
+            stored = _store_embedding(query, np.asarray(emb, dtype=np.float32))
+            # Fire-and-forget: the INSERT+commit fsyncs, so it runs on
+            # EXECUTOR and nobody waits on it — a lost write just means a
+            # future cold-start cache miss.
+            loop.run_in_executor(EXECUTOR, _disk_cache_put, query, stored)
+            if not fut.done():
+                fut.set_result(stored)
+
+
+@app.on_event("startup")
+async def _start_embedding_batcher() -> None:
+    asyncio.create_task(_embedding_batcher())
+
+
+@app.on_event("startup")
+async def _warmup_embedder() -> None:
+    # One throwaway batch triggers kernel selection, allocator ramp-up and
+    # tokenizer caches so the first real request doesn't pay for them;
+    # autograd is switched off globally while we're at it.
+    torch.set_grad_enabled(False)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(EXECUTOR, embed_model.encode, ["warmup"] * 4)
+
+
+async def retrieve_chunks(
+    query: str,
+    k: int = TOP_K,
+    metadata_filter: Optional[Dict[str, Any]] = None,
+    precomputed_emb: Optional[np.ndarray] = None,
+) -> List[Snippet]:
+    """Embed the query and pull the top-k chunks from the vector store.
+
+    Callers that retry with a different filter pass ``precomputed_emb``
+    so the query is embedded only once.
+    """
+    q_emb = precomputed_emb if precomputed_emb is not None else await get_embedding(query)
+    filter_key = tuple(sorted(metadata_filter.items())) if metadata_filter else None
+
+    with _cache_lock:
+        if _recent_queries:
+            sims = np.stack([e for e, _, _ in _recent_queries]) @ q_emb
+            best = int(sims.argmax())
+            if (
+                sims[best] >= _SEMANTIC_CACHE_THRESHOLD
+                and _recent_queries[best][1] == filter_key
+            ):
+                return list(_recent_queries[best][2])
+
+    loop = asyncio.get_running_loop()
+    snippets = await loop.run_in_executor(
+        EXECUTOR, _vector_search_sync, q_emb, k, metadata_filter
+    )
+
+    with _cache_lock:
+        _recent_queries.append((q_emb, filter_key, tuple(snippets)))
+    return snippets
+
+
+# C-level column extraction for metadata rows (skips the row_id column).
+_row_fields = operator.itemgetter(1, 2, 3, 4, 5)
+
+
+def _vector_search_sync(
+    q_emb: np.ndarray,
+    k: int,
+    metadata_filter: Optional[Dict[str, Any]],
+) -> List[Snippet]:
+    """Blocking index search + metadata join; runs on EXECUTOR."""
+    jurisdiction = metadata_filter.get("jurisdiction") if metadata_filter else None
+    if jurisdiction is not None:
+        # Narrow filter: brute-force rerank the matching rows instead of
+        # an HNSW query plus post-filtering.
+        with _meta_db_lock:
+            rows = meta_db.execute(
+                "SELECT row_id FROM metadata WHERE jurisdiction = ?",
+                (jurisdiction,),
+            ).fetchall()
+        ranked = _exact_rerank(q_emb, [r[0] for r in rows], k)
+    elif len(vec_index):
+        matches = vec_index.search(q_emb, k)
+        ranked = [
+            (int(key), 1.0 - float(dist))
+            for key, dist in zip(matches.keys, matches.distances)
+        ]
+    else:
+        ranked = []
+
+    snippets: List[Snippet] = []
+    if ranked:
+        placeholders = ",".join("?" * len(ranked))
+        with _meta_db_lock:
+            rows = meta_db.execute(
+                "SELECT row_id, scheme_id, title, source_url, page_no, doc_text "
+                f"FROM metadata WHERE row_id IN ({placeholders})",
+                [rid for rid, _ in ranked],
+            ).fetchall()
+        meta_by_id = {row[0]: row for row in rows}
+        for rid, score in ranked:
+            row = meta_by_id.get(rid)
+            if row is None:
+                continue
+            scheme_id, title, source_url, page_no, doc_text = _row_fields(row)
+            snippets.append(
+                Snippet(
+                    # Interned: the same id repeats across snippets.
+                    scheme_id=sys.intern(scheme_id) if scheme_id else None,
+                    title=title,
+                    text=doc_text[:MAX_SNIPPET_CHARS],
+                    source_url=source_url,
+                    page_no=page_no,
+                    score=score,
+                )
+            )
+    return snippets
+
+
+# Static scaffold kept in a separate system message: providers that
+# discount repeated prompt prefixes (OpenAI/Anthropic prompt caching) can
+# then reuse it across requests, and only the profile+snippets vary.
+SYSTEM_PROMPT = (
+    "You are CivicRAG, an expert on Indian government welfare schemes. "
+    "Given a citizen profile and retrieved document snippets, pick the "
+    "schemes the citizen is most likely eligible for.\n"
+    "Respond with a single JSON object of the form "
+    '{"summary": str, "recommendations": [{"scheme_id": str, '
+    '"title": str, "reason": str, "confidence": float}]}. '
+    "Only recommend schemes supported by the snippets; cite the snippet "
+    "facts in each reason. Do not invent schemes."
+)
+
+
+def _build_user_content(profile: Profile, snippets: List[Snippet]) -> str:
+    profile_json = orjson.dumps(profile.model_dump()).decode()
+    snippet_block = "\n".join(
+        f"[{i + 1}] scheme_id={s.scheme_id} title={s.title} "
+        f"page={s.page_no}\n{s.text}"
+        for i, s in enumerate(snippets)
+    )
+    return f"Citizen profile:\n{profile_json}\n\nSnippets:\n{snippet_block}"
+
+
+# Application-level batching for LLM calls: prompts arriving within a
+# short window are submitted together (bounded by a semaphore so a spike
+# cannot fan out unlimited upstream requests), and a leaky bucket keeps
+# the request rate under the provider's per-minute quota.
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "20"))
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get("LLM_REQUESTS_PER_MINUTE", "500"))
+_LLM_BATCH_WINDOW_S = 0.02
+
+_llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+_pending_llm: List[Any] = []
+
+
+class _LeakyBucket:
+    """Minimal per-minute request throttle."""
+
+    def __init__(self, rate_per_minute: int) -> None:
+        self.rate = rate_per_minute
+        self.allowance = float(rate_per_minute)
+        self.last = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.allowance = min(
+                self.rate, self.allowance + (now - self.last) * self.rate / 60.0
+            )
+            self.last = now
+            if self.allowance >= 1.0:
+                self.allowance -= 1.0
+                return
+            await asyncio.sleep((1.0 - self.allowance) * 60.0 / self.rate)
+
+
+_llm_bucket = _LeakyBucket(LLM_REQUESTS_PER_MINUTE)
+
+
+async def _post_llm(url: str, **kwargs) -> httpx.Response:
+    await _llm_bucket.acquire()
+    async with _llm_semaphore:
+        return await http_client.post(url, **kwargs)
+
+
+async def _call_llm(url: str, **kwargs) -> httpx.Response:
+    """Enqueue an LLM request; the submitter coalesces a window of them."""
+    fut = asyncio.get_running_loop().create_future()
+    _pending_llm.append((url, kwargs, fut))
+    return await fut
+
+
+async def _submit_llm_call(url: str, kwargs: Dict[str, Any], fut: asyncio.Future) -> None:
+    try:
+        resp = await _post_llm(url, **kwargs)
+    except Exception as exc:
+        if not fut.done():
+            fut.set_exception(exc)
+    else:
+        if not fut.done():
+            fut.set_result(resp)
+
+
+async def _llm_submitter() -> None:
+    # Each drained call is dispatched as its own task: the drain loop
+    # never awaits in-flight requests, so new windows keep submitting
+    # while earlier calls are outstanding (bounded by _llm_semaphore),
+    # and every future resolves as soon as its own call completes rather
+    # than when the slowest call in its window does.
+    while True:
+        await asyncio.sleep(_LLM_BATCH_WINDOW_S)
+        if not _pending_llm:
+            continue
+        batch = _pending_llm[:]
+        del _pending_llm[: len(batch)]
+        for url, kw, fut in batch:
+            asyncio.create_task(_submit_llm_call(url, kw, fut))
+
+
+@app.on_event("startup")
+async def _start_llm_submitter() -> None:
+    asyncio.create_task(_llm_submitter())
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _extract_json_object(text: str) -> Dict[str, Any]:
+    """Parse the first JSON object in ``text``, ignoring trailing prose.
+
+    raw_decode consumes exactly one object from the offset in a single
+    C-level pass, so prose after the JSON block no longer breaks parsing.
+    """
+    start = text.find("{")
+    if start == -1:
+        return {}
+    try:
+        obj, _ = _JSON_DECODER.raw_decode(text, start)
+    except json.JSONDecodeError:
+        return {}
+    return obj if isinstance(obj, dict) else {}
+
+
+async def synthesize_answer(
+    profile: Profile, snippets: List[Snippet]
+) -> RecommendResponse:
+    """Ask the LLM to turn retrieved snippets into ranked recommendations."""
+    user_content = _build_user_content(profile, snippets)
+
+    if OPENAI_API_KEY:
+        resp = await _call_llm(
+            "https://api.openai.com/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {OPENAI_API_KEY}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "model": OPENAI_MODEL,
+                "messages": [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": user_content},
+                ],
+                "temperature": 0,
+                "response_format": {"type": "json_object"},
+            },
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        text = data["choices"][0]["message"]["content"]
+    else:
+        resp = await _call_llm(
+            f"{GEMINI_BASE_URL}/v1beta/models/{GEMINI_MODEL}:generateContent",
+            params={"key": GEMINI_API_KEY},
+            json={
+                "system_instruction": {"parts": [{"text": SYSTEM_PROMPT}]},
+                "contents": [{"role": "user", "parts": [{"text": user_content}]}],
+            },
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        text = data["candidates"][0]["content"]["parts"][0]["text"]
+
+    payload = _extract_json_object(text)
+
+    by_scheme: Dict[Any, List[Snippet]] = {}
+    for s in snippets:
+        by_scheme.setdefault(s.scheme_id, []).append(s)
+
+    recommendations = []
+    for rec in payload.get("recommendations", []):
+        sid = rec.get("scheme_id")
+        recommendations.append(
+            Recommendation(
+                scheme_id=sid,
+                title=rec.get("title", ""),
+                reason=rec.get("reason", ""),
+                confidence=float(rec.get("confidence", 0.0)),
+                snippets=[
+                    RecommendationSnippet(
+                        scheme_id=s.scheme_id,
+                        title=s.title,
+                        text=s.text,
+                        source_url=s.source_url,
+                        page_no=s.page_no,
+                        score=s.score,
+                    )
+                    for s in by_scheme.get(sid, [])
+                ],
+            )
+        )
+    return RecommendResponse(
+        summary=payload.get("summary", ""), recommendations=recommendations
+    )
+
+
+# Coarse profile buckets: two profiles in the same state/occupation with
+# similar age and income retrieve the same snippets, so cache retrieval
+# on the bucketed key rather than the raw field values.
+_PROFILE_CACHE_MAX = 4096
+_profile_cache: "collections.OrderedDict[tuple, tuple]" = collections.OrderedDict()
+
+
+def _age_bucket(age: Optional[int]) -> int:
+    return -1 if age is None else age // 10
+
+
+def _income_bucket(income: Optional[float]) -> int:
+    if income is None or income <= 0:
+        return -1
+    return int(math.log10(income) * 2)
+
+
+def canonical_key(p: Profile) -> str:
+    return (
+        f"{p.state}|{p.occupation}|{_age_bucket(p.age)}|"
+        f"{_income_bucket(p.annual_income)}|{p.gender}"
+    )
+
+
+def _build_profile_query(profile: Profile) -> str:
+    parts = []
+    if profile.occupation:
+        parts.append(profile.occupation)
+    if profile.state:
+        parts.append(profile.state)
+    if profile.age is not None:
+        parts.append(f"age {profile.age}")
+    if profile.annual_income is not None:
+        parts.append(f"annual income {int(profile.annual_income)}")
+    if profile.gender:
+        parts.append(profile.gender)
+    if profile.text:
+        parts.append(profile.text)
+    return " | ".join(parts) if parts else "government welfare schemes"
+
+
+async def _retrieve_for_profile(profile: Profile) -> List[Snippet]:
+    query = _build_profile_query(profile)
+    metadata_filter = {"jurisdiction": profile.state} if profile.state else None
+
+    # Free-form text bypasses the bucketed cache.
+    cache_key = None
+    if not profile.text:
+        cache_key = (
+            canonical_key(profile),
+            tuple(sorted(metadata_filter.items())) if metadata_filter else None,
+        )
+        with _cache_lock:
+            cached = _profile_cache.get(cache_key)
+            if cached is not None:
+                _profile_cache.move_to_end(cache_key)
+        if cached is not None:
+            return list(cached)
+
+    q_emb = await get_embedding(query)
+    snippets = await retrieve_chunks(query, TOP_K, metadata_filter, precomputed_emb=q_emb)
+    if not snippets and metadata_filter:
+        # Broaden to all jurisdictions, reusing the embedding.
+        snippets = await retrieve_chunks(query, TOP_K, None, precomputed_emb=q_emb)
+
+    if cache_key is not None:
+        with _cache_lock:
+            _profile_cache[cache_key] = tuple(snippets)
+            while len(_profile_cache) > _PROFILE_CACHE_MAX:
+                _profile_cache.popitem(last=False)
+    return snippets
+
+
+class EmbedBatchIn(BaseModel):
+    texts: List[str]
+
+
+@app.post("/embed_batch")
+async def embed_batch(body: EmbedBatchIn):
+    loop = asyncio.get_running_loop()
+    embs = await loop.run_in_executor(EXECUTOR, encode_batch, body.texts)
+    return {"embeddings": embs.tolist()}
+
+
+# With temperature=0 the response is a pure function of the profile, so
+# it can be keyed by a profile hash: clients get 304s via ETag, and a
+# small server-side LRU of serialized bodies skips regeneration too.
+_RESPONSE_CACHE_MAX = 1000
+_response_cache: "collections.OrderedDict[str, bytes]" = collections.OrderedDict()
+_CACHE_HEADERS = {"Cache-Control": "private, max-age=3600"}
+
+
+@app.post("/recommend")
+async def recommend(profile: Profile, request: Request):
+    etag = hashlib.sha256(orjson.dumps(profile.model_dump())).hexdigest()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304)
+    headers = {"ETag": etag, **_CACHE_HEADERS}
+
+    with _cache_lock:
+        body = _response_cache.get(etag)
+        if body is not None:
+            _response_cache.move_to_end(etag)
+    if body is None:
+        snippets = await _retrieve_for_profile(profile)
+        resp = await synthesize_answer(profile, snippets)
+        body = orjson.dumps(resp.model_dump())
+        with _cache_lock:
+            _response_cache[etag] = body
+            while len(_response_cache) > _RESPONSE_CACHE_MAX:
+                _response_cache.popitem(last=False)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _stream_llm_text(user_content: str):
+    """Yield text deltas from the LLM as they are generated.
+
+    The bucket/semaphore pair that meters _call_llm is held for the life
+    of the stream, so LLM_MAX_CONCURRENCY and LLM_REQUESTS_PER_MINUTE
+    bound total upstream traffic — streamed and buffered alike.
+    """
+    await _llm_bucket.acquire()
+    await _llm_semaphore.acquire()
+    try:
+        if OPENAI_API_KEY:
+            async with http_client.stream(
+                "POST",
+                "https://api.openai.com/v1/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {OPENAI_API_KEY}",
+                    "Content-Type": "application/json",
+                },
+                json={
+                    "model": OPENAI_MODEL,
+                    "messages": [
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": user_content},
+                    ],
+                    "temperature": 0,
+                    "stream": True,
+                },
+            ) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    payload = line[len("data: "):]
+                    if payload == "[DONE]":
+                        break
+                    try:
+                        delta = json.loads(payload)["choices"][0]["delta"].get("content")
+                    except (KeyError, IndexError, json.JSONDecodeError):
+                        continue
+                    if delta:
+                        yield delta
+        else:
+            async with http_client.stream(
+                "POST",
+                f"{GEMINI_BASE_URL}/v1beta/models/{GEMINI_MODEL}:streamGenerateContent",
+                params={"key": GEMINI_API_KEY, "alt": "sse"},
+                json={
+                    "system_instruction": {"parts": [{"text": SYSTEM_PROMPT}]},
+                    "contents": [{"role": "user", "parts": [{"text": user_content}]}],
+                },
+            ) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    try:
+                        data = json.loads(line[len("data: "):])
+                        parts = data["candidates"][0]["content"]["parts"]
+                    except (KeyError, IndexError, json.JSONDecodeError):
+                        continue
+                    for part in parts:
+                        text = part.get("text")
+                        if text:
+                            yield text
+    finally:
+        _llm_semaphore.release()
+
+
+@app.post("/recommend/stream")
+async def recommend_stream(profile: Profile):
+    """Streaming variant of /recommend: tokens are forwarded over SSE as
+    the LLM generates them, so first output reaches the client at
+    first-token latency instead of full-generation latency."""
+    snippets = await _retrieve_for_profile(profile)
+    user_content = _build_user_content(profile, snippets)
+
+    async def gen():
+        async for delta in _stream_llm_text(user_content):
+            yield {"event": "token", "data": delta}
+        yield {"event": "done", "data": ""}
+
+    return EventSourceResponse(gen())
+
+
+# ---------------------------------------------------------------------------
+# Strict rule-based path (/retrieve + /synthesize)
+# ---------------------------------------------------------------------------
+
+# Mirrors MOCK_SCHEMES in constants.ts.
+_SCHEME_ROWS: List[Dict[str, Any]] = [
+    {
+        "id": "pm-kisan",
+        "name": "PM Kisan Samman Nidhi",
+        "name_hi": "प्रधानमंत्री किसान सम्मान निधि",
+        "description": "Income support of Rs 6000 per year for all land holding farmer families.",
+        "description_hi": "सभी भूमिधारक किसान परिवारों के लिए प्रति वर्ष 6000 रुपये की आय सहायता।",
+        "eligibilityCriteria": [
+            "Landholding farmer families",
+            "Excludes institutional landholders",
+            "Excludes income tax payers",
+        ],
+        "eligibilityCriteria_hi": [
+            "भूमिधारक किसान परिवार",
+            "संस्थागत भूमिधारकों को छोड़कर",
+            "आयकर दाताओं को छोड़कर",
+        ],
+        "benefits": "INR 6000 per year in 3 installments.",
+        "benefits_hi": "3 किस्तों में प्रति वर्ष 6000 रुपये।",
+        "category": "Agriculture",
+        "category_hi": "कृषि",
+        "sourceUrl": "https://pmkisan.gov.in",
+        "state": "Central",
+    },
+    {
+        "id": "ayushman-bharat",
+        "name": "Ayushman Bharat (PM-JAY)",
+        "name_hi": "आयुष्मान भारत (PM-JAY)",
+        "description": "Health assurance scheme providing cover of Rs. 5 lakhs per family per year for secondary and tertiary care hospitalization.",
+        "description_hi": "माध्यमिक और तृतीयक देखभाल अस्पताल में भर्ती के लिए प्रति परिवार प्रति वर्ष 5 लाख रुपये का स्वास्थ्य कवर।",
+        "eligibilityCriteria": [
+            "Identified families based on SECC 2011 data",
+            "Households with no adult member between 16-59",
+            "Households with no able-bodied adult member",
+        ],
+        "eligibilityCriteria_hi": [
+            "एसईसीसी 2011 डेटा के आधार पर पहचाने गए परिवार",
+            "ऐसे परिवार जिनमें 16-59 वर्ष के बीच कोई वयस्क सदस्य नहीं है",
+            "ऐसे परिवार जिनमें कोई सक्षम वयस्क सदस्य नहीं है",
+        ],
+        "benefits": "Cashless access to health care services up to INR 5 Lakhs.",
+        "benefits_hi": "5 लाख रुपये तक की कैशलेस स्वास्थ्य सेवाएँ।",
+        "category": "Health",
+        "category_hi": "स्वास्थ्य",
+        "sourceUrl": "https://pmjay.gov.in",
+        "state": "Central",
+    },
+    {
+        "id": "pm-svanidhi",
+        "name": "PM SVANidhi",
+        "name_hi": "पीएम स्वनिधि",
+        "description": "Special Micro-Credit Facility for Street Vendors.",
+        "description_hi": "सड़क विक्रेताओं के लिए विशेष माइक्रो-क्रेडिट सुविधा।",
+        "eligibilityCriteria": [
+            "Street vendors in urban areas",
+            "Vending on or before 24 March 2020",
+        ],
+        "eligibilityCriteria_hi": [
+            "शहरी क्षेत्रों में सड़क विक्रेता",
+            "24 मार्च 2020 को या उससे पहले वेंडिंग",
+        ],
+        "benefits": "Working capital loan up to Rs. 10,000.",
+        "benefits_hi": "10,000 रुपये तक का कार्यशील पूंजी ऋण।",
+        "category": "Business/Loan",
+        "category_hi": "व्यापार/ऋण",
+        "sourceUrl": "https://pmsvanidhi.mohua.gov.in",
+        "state": "Central",
+    },
+    {
+        "id": "sukanya-samriddhi",
+        "name": "Sukanya Samriddhi Yojana",
+        "name_hi": "सुकन्या समृद्धि योजना",
+        "description": "A small deposit scheme for the girl child.",
+        "description_hi": "बालिकाओं के लिए एक छोटी जमा योजना।",
+        "eligibilityCriteria": [
+            "Girl child below 10 years of age",
+            "Account can be opened by parent/guardian",
+        ],
+        "eligibilityCriteria_hi": [
+            "10 वर्ष से कम उम्र की बालिका",
+            "खाता माता-पिता/अभिभावक द्वारा खोला जा सकता है",
+        ],
+        "benefits": "High interest rate, tax benefits under 80C.",
+        "benefits_hi": "उच्च ब्याज दर, 80सी के तहत कर लाभ।",
+        "category": "Child Welfare",
+        "category_hi": "बाल कल्याण",
+        "sourceUrl": "https://www.nsiindia.gov.in",
+        "state": "Central",
+    },
+    {
+        "id": "atal-pension",
+        "name": "Atal Pension Yojana",
+        "name_hi": "अटल पेंशन योजना",
+        "description": "Pension scheme for unorganized sector workers.",
+        "description_hi": "असंगठित क्षेत्र के श्रमिकों के लिए पेंशन योजना।",
+        "eligibilityCriteria": [
+            "Age between 18-40 years",
+            "Have a savings bank account",
+        ],
+        "eligibilityCriteria_hi": [
+            "उम्र 18-40 वर्ष के बीच",
+            "बचत बैंक खाता होना चाहिए",
+        ],
+        "benefits": "Guaranteed pension of Rs 1000-5000 per month after 60 years.",
+        "benefits_hi": "60 वर्ष के बाद 1000-5000 रुपये प्रति माह की गारंटीड पेंशन।",
+        "category": "Pension",
+        "category_hi": "पेंशन",
+        "sourceUrl": "https://www.npscra.nsdl.co.in",
+        "state": "Central",
+    },
+    {
+        "id": "ladli-behna",
+        "name": "Mukhyamantri Ladli Behna Yojana (MP)",
+        "name_hi": "मुख्यमंत्री लाड़ली बहना योजना (मध्य प्रदेश)",
+        "description": "Financial assistance scheme for women in Madhya Pradesh.",
+        "description_hi": "मध्य प्रदेश में महिलाओं के लिए वित्तीय सहायता योजना।",
+        "eligibilityCriteria": [
+            "Resident of Madhya Pradesh",
+            "Married women aged 21-60 years",
+            "Family income less than 2.5 Lakhs",
+        ],
+        "eligibilityCriteria_hi": [
+            "मध्य प्रदेश की निवासी",
+            "21-60 वर्ष की विवाहित महिलाएं",
+            "पारिवारिक आय 2.5 लाख से कम",
+        ],
+        "benefits": "INR 1250 per month directly to bank account.",
+        "benefits_hi": "1250 रुपये प्रति माह सीधे बैंक खाते में।",
+        "category": "Women Welfare",
+        "category_hi": "महिला कल्याण",
+        "sourceUrl": "https://cmladlibehna.mp.gov.in/",
+        "state": "Madhya Pradesh",
+    },
+    {
+        "id": "rythu-bandhu",
+        "name": "Rythu Bandhu (Telangana)",
+        "name_hi": "रायथु बंधु (तेलंगाना)",
+        "description": "Investment Support Scheme for landholding farmers.",
+        "description_hi": "भूमिधारक किसानों के लिए निवेश सहायता योजना।",
+        "eligibilityCriteria": [
+            "Resident of Telangana",
+            "Must own farm land",
+            "Commercial farmers excluded",
+        ],
+        "eligibilityCriteria_hi": [
+            "तेलंगाना के निवासी",
+            "कृषि भूमि का स्वामी होना चाहिए",
+            "वाणिज्यिक किसान शामिल नहीं",
+        ],
+        "benefits": "INR 5000 per acre per season.",
+        "benefits_hi": "5000 रुपये प्रति एकड़ प्रति सीजन।",
+        "category": "Agriculture",
+        "category_hi": "कृषि",
+        "sourceUrl": "http://rythubandhu.telangana.gov.in/",
+        "state": "Telangana",
+    },
+    {
+        "id": "kanyashree",
+        "name": "Kanyashree Prakalpa (West Bengal)",
+        "name_hi": "कन्याश्री प्रकल्प (पश्चिम बंगाल)",
+        "description": "Conditional Cash Transfer Scheme for improving the status and well being of the girl child.",
+        "description_hi": "बालिकाओं की स्थिति और कल्याण में सुधार के लिए सशर्त नकद हस्तांतरण योजना।",
+        "eligibilityCriteria": [
+            "Resident of West Bengal",
+            "Girl student aged 13-18 years",
+            "Unmarried",
+        ],
+        "eligibilityCriteria_hi": [
+            "पश्चिम बंगाल की निवासी",
+            "13-18 वर्ष की छात्रा",
+            "अविवाहित",
+        ],
+        "benefits": "Annual scholarship of INR 1000 and one-time grant of INR 25,000.",
+        "benefits_hi": "1000 रुपये की वार्षिक छात्रवृत्ति और 25,000 रुपये का एकमुश्त अनुदान।",
+        "category": "Education/Women",
+        "category_hi": "शिक्षा/महिला",
+        "sourceUrl": "https://www.wbkanyashree.gov.in/",
+        "state": "West Bengal",
+    },
+    {
+        "id": "delhi-electricity",
+        "name": "Delhi Free Electricity Scheme",
+        "name_hi": "दिल्ली मुफ्त बिजली योजना",
+        "description": "Subsidy on electricity bills for domestic consumers in Delhi.",
+        "description_hi": "दिल्ली में घरेलू उपभोक्ताओं के लिए बिजली बिल पर सब्सिडी।",
+        "eligibilityCriteria": [
+            "Resident of Delhi",
+            "Domestic electricity connection",
+            "Consumption up to 200 units (Free)",
+        ],
+        "eligibilityCriteria_hi": [
+            "दिल्ली के निवासी",
+            "घरेलू बिजली कनेक्शन",
+            "200 यूनिट तक खपत (मुफ्त)",
+        ],
+        "benefits": "Zero bill for consumption up to 200 units.",
+        "benefits_hi": "200 यूनिट तक की खपत के लिए शून्य बिल।",
+        "category": "Utility",
+        "category_hi": "उपयोगिता",
+        "sourceUrl": "https://delhi.gov.in",
+        "state": "Delhi",
+    },
+]
+
+
+def _freeze_scheme(row: Dict[str, Any]) -> Mapping[str, Any]:
+    row["id"] = sys.intern(row["id"])
+    return MappingProxyType(row)
+
+
+# The catalog never changes at runtime: read-only proxies make mutation a
+# TypeError instead of a silent cache-poisoning bug, and interned ids let
+# downstream dict lookups compare by pointer.
+SCHEMES: Tuple[Mapping[str, Any], ...] = tuple(
+    _freeze_scheme(r) for r in _SCHEME_ROWS
+)
+del _SCHEME_ROWS
+
+
+# Inputs on the strict path are msgspec Structs decoded straight from
+# the request body: msgspec validates against the annotations during its
+# C-level JSON parse, so there is no per-request Pydantic model build.
+class ProfileIn(msgspec.Struct):
+    name: Optional[str] = None
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    state: Optional[str] = None
+    income: Optional[float] = None
+    occupation: Optional[str] = None
+    category: Optional[str] = None
+    disability: Optional[bool] = None
+
+
+class RetrieveIn(msgspec.Struct):
+    profile: ProfileIn
+
+
+class SchemeOut(TypedDict, total=False):
+    """Shape of a scheme as served to clients.
+
+    The data originates from the static SCHEMES list, so it is typed but
+    never re-validated per request (a TypedDict costs nothing at
+    runtime, unlike a 14-field model instantiation per scheme).
+    """
+
+    id: str
+    name: str
+    name_hi: str
+    description: str
+    description_hi: str
+    eligibilityCriteria: List[str]
+    eligibilityCriteria_hi: List[str]
+    benefits: str
+    benefits_hi: str
+    category: str
+    category_hi: str
+    sourceUrl: str
+    state: str
+    matchScore: float
+
+
+class SynthesizeIn(msgspec.Struct):
+    profile: ProfileIn
+    schemes: List[Dict[str, Any]]
+    language: str = "en"
+
+
+_RETRIEVE_DECODER = msgspec.json.Decoder(RetrieveIn)
+_SYNTHESIZE_DECODER = msgspec.json.Decoder(SynthesizeIn)
+
+
+def _decode_body(raw: bytes, decoder: "msgspec.json.Decoder"):
+    try:
+        return decoder.decode(raw)
+    except msgspec.DecodeError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+# Normalized per-profile facts, computed once per lookup and fed to the
+# scoring kernels below.
+
+@dataclasses.dataclass(slots=True)
+class _RuleCtx:
+    age: Optional[int]
+    income: Optional[float]
+    is_female: bool
+    is_student: bool
+    is_farmer: bool
+    is_vendor: bool
+
+
+SCHEMES_BY_STATE: Dict[str, List[str]] = {}
+for _s in SCHEMES:
+    SCHEMES_BY_STATE.setdefault((_s["state"] or "Central").lower(), []).append(
+        _s["id"]
+    )
+
+
+# The eligibility rules (mirroring retrieveSchemes in
+# services/ragService.ts): each scheme's constraints collapse to
+# age/income bounds, requirement flags and a score, declared once here
+# and packed into parallel NumPy arrays aligned with SCHEMES order. A
+# numba-jitted kernel scores every scheme in one call; without numba the
+# vectorized NumPy kernel below does the same in one boolean-mask pass.
+#
+# Sentinels: a missing age is -1 (fails any scheme with a real AGE_MIN,
+# which is >= 0; unconstrained bounds are encoded as -1e9/1e9) and a
+# missing income is 1e12 (fails real caps, passes the unconstrained cap
+# of 1e15) — matching the frontend, where Number(undefined) is NaN and
+# every age/income comparison fails.
+
+# id -> (age_min, age_max, income_max, female, farmer, vendor, student, score)
+_RULE_PARAMS: Dict[str, Tuple[float, float, float, bool, bool, bool, bool, float]] = {
+    "pm-kisan": (-1e9, 1e9, 1e15, False, True, False, False, 0.9),
+    "pm-svanidhi": (-1e9, 1e9, 1e15, False, False, True, False, 0.9),
+    "ayushman-bharat": (-1e9, 1e9, 500000.0, False, False, False, False, 0.8),
+    "atal-pension": (18.0, 40.0, 1e15, False, False, False, False, 0.85),
+    "sukanya-samriddhi": (0.0, 10.0, 1e15, True, False, False, False, 0.95),
+    "ladli-behna": (21.0, 60.0, 250000.0, True, False, False, False, 0.95),
+    "rythu-bandhu": (-1e9, 1e9, 1e15, False, True, False, False, 0.95),
+    "kanyashree": (13.0, 18.0, 1e15, True, False, False, True, 0.95),
+    "delhi-electricity": (-1e9, 1e9, 1e15, False, False, False, False, 0.9),
+}
+
+_STATE_CODES: Dict[str, int] = {
+    state: code for code, state in enumerate(SCHEMES_BY_STATE)
+}  # "central" inserted first above, so it gets code 0
+
+_AGE_MIN = np.array([_RULE_PARAMS[s["id"]][0] for s in SCHEMES])
+_AGE_MAX = np.array([_RULE_PARAMS[s["id"]][1] for s in SCHEMES])
+_INCOME_MAX = np.array([_RULE_PARAMS[s["id"]][2] for s in SCHEMES])
+_REQ_FEMALE = np.array([_RULE_PARAMS[s["id"]][3] for s in SCHEMES])
+_REQ_FARMER = np.array([_RULE_PARAMS[s["id"]][4] for s in SCHEMES])
+_REQ_VENDOR = np.array([_RULE_PARAMS[s["id"]][5] for s in SCHEMES])
+_REQ_STUDENT = np.array([_RULE_PARAMS[s["id"]][6] for s in SCHEMES])
+_BASE_SCORE = np.array([_RULE_PARAMS[s["id"]][7] for s in SCHEMES])
+_SCHEME_STATE = np.array(
+    [_STATE_CODES[(s["state"] or "Central").lower()] for s in SCHEMES],
+    dtype=np.int64,
+)
+
+_MISSING_AGE = -1.0
+_MISSING_INCOME = 1e12
+
+
+def _score_kernel_py(
+    age, income, is_female, is_farmer, is_vendor, is_student, user_state,
+    age_min, age_max, income_max, req_female, req_farmer, req_vendor,
+    req_student, scheme_state, base_score,
+):
+    out = np.zeros(base_score.shape[0])
+    for i in range(base_score.shape[0]):
+        if scheme_state[i] != 0 and scheme_state[i] != user_state:
+            continue
+        if req_female[i] and not is_female:
+            continue
+        if req_farmer[i] and not is_farmer:
+            continue
+        if req_vendor[i] and not is_vendor:
+            continue
+        if req_student[i] and not is_student:
+            continue
+        if age < age_min[i] or age > age_max[i]:
+            continue
+        if income >= income_max[i]:
+            continue
+        out[i] = base_score[i]
+    return out
+
+
+def _score_vectorized(
+    age, income, is_female, is_farmer, is_vendor, is_student, user_state,
+    age_min, age_max, income_max, req_female, req_farmer, req_vendor,
+    req_student, scheme_state, base_score,
+):
+    """Same semantics as _score_kernel_py, but as one boolean-mask pass
+    over all schemes — no per-scheme Python bytecode."""
+    ok = (scheme_state == 0) | (scheme_state == user_state)
+    ok &= is_female | ~req_female
+    ok &= is_farmer | ~req_farmer
+    ok &= is_vendor | ~req_vendor
+    ok &= is_student | ~req_student
+    ok &= (age >= age_min) & (age <= age_max)
+    ok &= income < income_max
+    return np.where(ok, base_score, 0.0)
+
+
+try:
+    from numba import njit
+
+    _score_kernel = njit(cache=True)(_score_kernel_py)
+    # Compile at import so the first request does not pay the JIT cost.
+    _score_kernel(
+        _MISSING_AGE, _MISSING_INCOME, False, False, False, False, -1,
+        _AGE_MIN, _AGE_MAX, _INCOME_MAX, _REQ_FEMALE, _REQ_FARMER,
+        _REQ_VENDOR, _REQ_STUDENT, _SCHEME_STATE, _BASE_SCORE,
+    )
+except Exception:
+    _score_kernel = _score_vectorized
+
+
+@functools.lru_cache(maxsize=4096)
+def _retrieve_cached(
+    age: Optional[int],
+    gender: Optional[str],
+    state: Optional[str],
+    income_bucket: Optional[int],
+    occupation: Optional[str],
+) -> Tuple[Tuple[str, float], ...]:
+    """Rule evaluation on the normalized profile tuple, memoized.
+
+    Income is bucketed to 10k; every rule threshold is a multiple of
+    10k, so flooring to the bucket edge preserves each comparison.
+    SCHEMES is immutable, so the cache never needs invalidation.
+    """
+    occ_tokens = set(occupation.split()) if occupation else set()
+    ctx = _RuleCtx(
+        age=age,
+        income=None if income_bucket is None else income_bucket * 10000.0,
+        is_female=bool(gender) and gender[0] == "f",
+        is_student=occupation == "student",
+        is_farmer="farmer" in occ_tokens,
+        is_vendor="vendor" in occ_tokens or "street" in occ_tokens,
+    )
+    scores = _score_kernel(
+        _MISSING_AGE if ctx.age is None else float(ctx.age),
+        _MISSING_INCOME if ctx.income is None else ctx.income,
+        ctx.is_female, ctx.is_farmer, ctx.is_vendor, ctx.is_student,
+        _STATE_CODES.get(state or "central", -1),
+        _AGE_MIN, _AGE_MAX, _INCOME_MAX, _REQ_FEMALE, _REQ_FARMER,
+        _REQ_VENDOR, _REQ_STUDENT, _SCHEME_STATE, _BASE_SCORE,
+    )
+    matched = [(SCHEMES[i]["id"], float(scores[i])) for i in np.nonzero(scores)[0]]
+    matched.sort(key=lambda t: t[1], reverse=True)
+    return tuple(matched)
+
+
+def _normalized_hits(profile: ProfileIn) -> Tuple[Tuple[str, float], ...]:
+    """Normalize the profile to a hashable tuple and look up (id, score)
+    pairs through the LRU cache."""
+    return _retrieve_cached(
+        profile.age,
+        profile.gender.lower() if profile.gender else None,
+        profile.state.lower() if profile.state else None,
+        None if profile.income is None else int(profile.income // 10000),
+        profile.occupation.lower() if profile.occupation else None,
+    )
+
+
+# The scheme catalog is static, so each scheme is serialized to JSON
+# bytes once at import; /retrieve splices in the matchScore and skips
+# jsonable_encoder entirely.
+SCHEME_JSON: Dict[str, bytes] = {s["id"]: orjson.dumps(dict(s)) for s in SCHEMES}
+
+
+def _scheme_json_with_score(sid: str, score: float) -> bytes:
+    return SCHEME_JSON[sid][:-1] + b',"matchScore":' + repr(score).encode() + b"}"
+
+
+# Prompt scaffolding is assembled once at import: the boilerplate around
+# the profile never varies, the instruction block only varies by
+# language, and a catalog scheme's context block is a constant — only
+# profile fields and unknown (client-supplied) schemes are formatted per
+# request.
+_PROMPT_HEADER = (
+    "You are an expert Government Scheme Consultant.\n"
+    "Based on the following user profile and the provided list of relevant "
+    "schemes (context), write a helpful summary explaining WHY the user "
+    "might be eligible for these specific schemes.\n\n"
+    "User Profile:\n"
+)
+
+_PROMPT_INSTRUCTIONS: Dict[str, str] = {
+    lang: (
+        "\n\nInstructions:\n"
+        f"1. Respond in {lang_name} language.\n"
+        "2. Be concise and encouraging.\n"
+        '3. Highlight specific eligibility matches (e.g., "Since you are a farmer...").\n'
+        "4. Do not invent schemes not in the list.\n"
+        "5. Format with markdown bullet points."
+    )
+    for lang, lang_name in (("en", "English"), ("hi", "Hindi"))
+}
+
+
+def _scheme_context_block(s: Mapping[str, Any]) -> str:
+    return (
+        f"Scheme: {s.get('name')}\nBenefits: {s.get('benefits')}\n"
+        f"Eligibility: {', '.join(s.get('eligibilityCriteria') or [])}\n"
+        f"Source: {s.get('sourceUrl')}"
+    )
+
+
+SCHEME_CTX_TEMPLATES: Dict[str, str] = {
+    s["id"]: _scheme_context_block(s) for s in SCHEMES
+}
+
+
+def build_synthesis_prompt(
+    profile: ProfileIn, schemes: List[Dict[str, Any]], language: str
+) -> str:
+    context_text = "\n---\n".join(
+        SCHEME_CTX_TEMPLATES.get(s.get("id") or "") or _scheme_context_block(s)
+        for s in schemes
+    )
+    return (
+        _PROMPT_HEADER
+        + f"Age: {profile.age}\n"
+        f"Income: INR {profile.income}\n"
+        f"Occupation: {profile.occupation}\n"
+        f"State: {profile.state}\n"
+        f"Gender: {profile.gender}"
+        + "\n\nRetrieved Schemes (Context):\n"
+        + context_text
+        + _PROMPT_INSTRUCTIONS.get(language, _PROMPT_INSTRUCTIONS["en"])
+    )
+
+
+# The v1beta generateContent route is the documented one for this model
+# family; the historical multi-endpoint probe (v1/v1beta2/-latest
+# variants with a persisted winner) is gone, along with its worst case of
+# four concurrent guesses per cold start. If the API surface moves again,
+# a startup healthcheck below fails loudly instead of requests quietly
+# walking dead endpoints.
+GEMINI_ENDPOINT = f"{GEMINI_BASE_URL}/v1beta/models/{GEMINI_MODEL}:generateContent"
+
+
+# Typed view of the generateContent response, decoded with msgspec like
+# the request bodies: shape checks happen during the C-level parse, so
+# the defensive isinstance walk over nested dicts is gone. Unknown
+# fields (role, finishReason, safetyRatings, ...) are skipped without
+# ever materializing Python objects for them.
+class _GeminiPart(msgspec.Struct):
+    text: Optional[str] = None
+
+
+class _GeminiContent(msgspec.Struct):
+    parts: Optional[List[_GeminiPart]] = None
+
+
+class _GeminiCandidate(msgspec.Struct):
+    content: Optional[_GeminiContent] = None
+
+
+class _GeminiResponse(msgspec.Struct):
+    candidates: Optional[List[_GeminiCandidate]] = None
+
+
+_GEMINI_DECODER = msgspec.json.Decoder(_GeminiResponse)
+
+
+def _candidate_text(candidate: _GeminiCandidate) -> Optional[str]:
+    if candidate.content is None or not candidate.content.parts:
+        return None
+    pieces = [p.text for p in candidate.content.parts if p.text]
+    return "\n".join(pieces) if pieces else None
+
+
+def _extract_gemini_text(raw: bytes) -> Optional[str]:
+    try:
+        data = _GEMINI_DECODER.decode(raw)
+    except msgspec.DecodeError:
+        return None
+    if not data.candidates:
+        return None
+    return _candidate_text(data.candidates[0])
+
+
+# Admission control for Gemini, mirroring the OpenAI-path limiter above:
+# a semaphore bounds in-flight calls and a leaky bucket keeps the request
+# rate under the per-minute quota. If a slot cannot be had within 5 s the
+# backend is saturated and the client gets an immediate 429 with
+# Retry-After instead of queueing into a timeout.
+GEMINI_MAX_INFLIGHT = int(os.environ.get("GEMINI_MAX_INFLIGHT", "16"))
+GEMINI_REQUESTS_PER_MINUTE = int(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", "500"))
+_GEMINI_ACQUIRE_TIMEOUT_S = 5.0
+
+_gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_INFLIGHT)
+_gemini_bucket = _LeakyBucket(GEMINI_REQUESTS_PER_MINUTE)
+
+
+async def _acquire_gemini_slot() -> None:
+    try:
+        await asyncio.wait_for(
+            _gemini_semaphore.acquire(), _GEMINI_ACQUIRE_TIMEOUT_S
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=429,
+            detail="LLM backend saturated, retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    try:
+        await asyncio.wait_for(_gemini_bucket.acquire(), _GEMINI_ACQUIRE_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        _gemini_semaphore.release()
+        raise HTTPException(
+            status_code=429,
+            detail="LLM rate limit exhausted, retry shortly",
+            headers={"Retry-After": "5"},
+        )
+
+
+async def call_gemini(prompt: str) -> Optional[str]:
+    """POST the prompt to the Gemini generateContent endpoint."""
+    await _acquire_gemini_slot()
+    try:
+        resp = await http_client.post(
+            GEMINI_ENDPOINT,
+            params={"key": GEMINI_API_KEY},
+            json={"contents": [{"role": "user", "parts": [{"text": prompt}]}]},
+            headers={"Content-Type": "application/json"},
+            timeout=25,
+        )
+    except httpx.HTTPError:
+        return None
+    finally:
+        _gemini_semaphore.release()
+    if resp.status_code != 200:
+        return None
+    return _extract_gemini_text(resp.content)
+
+
+@app.on_event("startup")
+async def _gemini_healthcheck() -> None:
+    """Ping the hard-coded endpoint once so a bad model name or API move
+    is a loud startup message, not a stream of silent fallbacks."""
+    if not GEMINI_API_KEY:
+        return
+    try:
+        resp = await http_client.post(
+            GEMINI_ENDPOINT,
+            params={"key": GEMINI_API_KEY},
+            json={"contents": [{"role": "user", "parts": [{"text": "ping"}]}]},
+            timeout=10,
+        )
+        status: Any = resp.status_code
+    except httpx.HTTPError as exc:
+        status = exc
+    if status != 200:
+        print(
+            f"WARNING: Gemini healthcheck failed ({status}) for "
+            f"{GEMINI_ENDPOINT}; /synthesize will serve fallback messages",
+            file=sys.stderr,
+        )
+
+
+# Experimental micro-batching for Gemini (ENABLE_BATCHING=1): concurrent
+# synthesize calls landing within a 25 ms window are folded into one
+# generateContent request carrying one user turn per prompt, and the
+# returned candidates are split back to the waiting futures. Relies on
+# the API answering one candidate per content; if the counts do not line
+# up the batch degrades to individual calls, so correctness never
+# depends on the batching path.
+_ENABLE_BATCHING = os.environ.get("ENABLE_BATCHING", "0") == "1"
+_GEMINI_BATCH_WINDOW_S = 0.025
+_GEMINI_MAX_BATCH = 8
+_gemini_batch_queue: "asyncio.Queue[Tuple[str, asyncio.Future]]" = asyncio.Queue()
+
+
+async def _call_gemini_batch(prompts: List[str]) -> List[Any]:
+    body = {
+        "contents": [
+            {"role": "user", "parts": [{"text": p}]} for p in prompts
+        ]
+    }
+    await _acquire_gemini_slot()
+    try:
+        resp = await http_client.post(
+            GEMINI_ENDPOINT,
+            params={"key": GEMINI_API_KEY},
+            json=body,
+            headers={"Content-Type": "application/json"},
+            timeout=25,
+        )
+        raw = resp.content if resp.status_code == 200 else None
+    except httpx.HTTPError:
+        raw = None
+    finally:
+        _gemini_semaphore.release()
+    candidates = None
+    if raw is not None:
+        try:
+            candidates = _GEMINI_DECODER.decode(raw).candidates
+        except msgspec.DecodeError:
+            candidates = None
+    if candidates is not None and len(candidates) == len(prompts):
+        return [_candidate_text(c) for c in candidates]
+    # Counts disagree (or the call failed outright): fan out individually
+    # (each call meters itself).
+    return list(
+        await asyncio.gather(
+            *[call_gemini(p) for p in prompts], return_exceptions=True
+        )
+    )
+
+
+async def _gemini_batcher() -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await _gemini_batch_queue.get()
+        batch = [item]
+        deadline = loop.time() + _GEMINI_BATCH_WINDOW_S
+        while len(batch) < _GEMINI_MAX_BATCH:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(
+                    await asyncio.wait_for(_gemini_batch_queue.get(), remaining)
+                )
+            except asyncio.TimeoutError:
+                break
+        # Dispatched as a task so the batcher goes straight back to
+        # draining the queue: batches overlap up to GEMINI_MAX_INFLIGHT
+        # instead of serializing one batch at a time.
+        asyncio.create_task(_run_gemini_batch(batch))
+
+
+async def _run_gemini_batch(batch: List[Tuple[str, asyncio.Future]]) -> None:
+    try:
+        if len(batch) == 1:
+            texts: List[Any] = [await call_gemini(batch[0][0])]
+        else:
+            texts = await _call_gemini_batch([p for p, _ in batch])
+    except Exception as exc:
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_exception(exc)
+        return
+    for (_, fut), text in zip(batch, texts):
+        if fut.done():
+            continue
+        if isinstance(text, Exception):
+            fut.set_exception(text)
+        else:
+            fut.set_result(text)
+
+
+@app.on_event("startup")
+async def _start_gemini_batcher() -> None:
+    if _ENABLE_BATCHING:
+        asyncio.create_task(_gemini_batcher())
+
+
+async def _gemini_dispatch(prompt: str) -> Optional[str]:
+    """Route a prompt through the micro-batcher when enabled."""
+    if not _ENABLE_BATCHING:
+        return await call_gemini(prompt)
+    fut: asyncio.Future = asyncio.get_running_loop().create_future()
+    await _gemini_batch_queue.put((prompt, fut))
+    return await fut
+
+
+# Synthesis cache, SIM-LRU style: exact tier keyed by prompt hash, plus
+# a similarity tier that reuses a cached response when the prompt
+# embedding is within threshold of a recent one (same profile fields and
+# matched schemes phrased marginally differently).
+_GEMINI_CACHE_MAX = 1000
+_GEMINI_SIM_THRESHOLD = 0.98
+_gemini_cache: "collections.OrderedDict[str, str]" = collections.OrderedDict()
+_gemini_recent: collections.deque = collections.deque(maxlen=_GEMINI_CACHE_MAX)
+
+
+async def call_gemini_cached(prompt: str, language: str = "en") -> Optional[str]:
+    key = hashlib.sha256(prompt.encode()).hexdigest()
+    with _cache_lock:
+        cached = _gemini_cache.get(key)
+        if cached is not None:
+            _gemini_cache.move_to_end(key)
+            return cached
+
+    emb = await get_embedding(prompt)
+    # The similarity tier only considers entries of the same language,
+    # mirroring the filter_key match in retrieve_chunks: the embedder
+    # truncates long prompts, so an en and a hi prompt differing only in
+    # the trailing instruction block can embed near-identically.
+    with _cache_lock:
+        same_lang = [(e, t) for e, lang, t in _gemini_recent if lang == language]
+        if same_lang:
+            sims = np.stack([e for e, _ in same_lang]) @ emb
+            best = int(sims.argmax())
+            if sims[best] >= _GEMINI_SIM_THRESHOLD:
+                return same_lang[best][1]
+
+    text = await _gemini_dispatch(prompt)
+    if text is not None:
+        with _cache_lock:
+            _gemini_cache[key] = text
+            while len(_gemini_cache) > _GEMINI_CACHE_MAX:
+                _gemini_cache.popitem(last=False)
+            _gemini_recent.append((emb, language, text))
+    return text
+
+
+# Optional cross-process cache: with multiple uvicorn workers the
+# in-process LRUs are per-worker, so a warm entry in one worker does not
+# help the other three. Pointing REDIS_URL at a Redis instance shares
+# /retrieve payloads and /synthesize analyses across workers (and
+# restarts) with a 24 h TTL; without it, or if Redis is unreachable,
+# behavior is unchanged.
+REDIS_URL = os.environ.get("REDIS_URL", "")
+_REDIS_TTL_S = 86400
+
+redis_client = None
+if REDIS_URL:
+    try:
+        import redis.asyncio as _aioredis
+
+        redis_client = _aioredis.from_url(REDIS_URL)
+    except ImportError:
+        redis_client = None
+
+
+async def _redis_get(key: bytes) -> Optional[bytes]:
+    if redis_client is None:
+        return None
+    try:
+        return await redis_client.get(key)
+    except Exception:
+        return None
+
+
+async def _redis_set(key: bytes, value: bytes) -> None:
+    if redis_client is None:
+        return
+    try:
+        await redis_client.set(key, value, ex=_REDIS_TTL_S)
+    except Exception:
+        pass
+
+
+def _profile_redis_key(profile: ProfileIn) -> bytes:
+    blob = orjson.dumps(msgspec.to_builtins(profile), option=orjson.OPT_SORT_KEYS)
+    return b"r:" + hashlib.sha256(blob).digest()
+
+
+FALLBACK_MESSAGES = {
+    "en": "Sorry, the AI summary is unavailable right now. "
+    "Please review the matched schemes above.",
+    "hi": "क्षमा करें, AI सारांश अभी उपलब्ध नहीं है। "
+    "कृपया ऊपर दी गई योजनाओं की सूची देखें।",
+}
+
+
+@app.on_event("shutdown")
+async def _close_http_client() -> None:
+    await http_client.aclose()
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "schemes": len(SCHEMES)}
+
+
+@app.post("/retrieve")
+async def retrieve(request: Request):
+    body = _decode_body(await request.body(), _RETRIEVE_DECODER)
+    key = _profile_redis_key(body.profile)
+    cached = await _redis_get(key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    hits = _normalized_hits(body.profile)
+    payload = (
+        b'{"schemes":['
+        + b",".join(_scheme_json_with_score(sid, score) for sid, score in hits)
+        + b"]}"
+    )
+    await _redis_set(key, payload)
+    return Response(content=payload, media_type="application/json")
+
+
+@app.post("/synthesize")
+async def synthesize(request: Request):
+    body = _decode_body(await request.body(), _SYNTHESIZE_DECODER)
+    prompt = build_synthesis_prompt(body.profile, body.schemes, body.language)
+    key = b"s:" + hashlib.sha256(prompt.encode()).digest()
+    cached = await _redis_get(key)
+    if cached is not None:
+        return {"analysis": cached.decode()}
+    out = await call_gemini_cached(prompt, body.language)
+    if out is not None:
+        await _redis_set(key, out.encode())
+    else:
+        out = FALLBACK_MESSAGES.get(body.language, FALLBACK_MESSAGES["en"])
+    return {"analysis": out}
+
+
+async def _stream_gemini_text(prompt: str):
+    """Yield text deltas from Gemini's streamGenerateContent as SSE chunks."""
+    async with http_client.stream(
+        "POST",
+        f"{GEMINI_BASE_URL}/v1beta/models/{GEMINI_MODEL}:streamGenerateContent",
+        params={"key": GEMINI_API_KEY, "alt": "sse"},
+        json={"contents": [{"role": "user", "parts": [{"text": prompt}]}]},
+        timeout=25,
+    ) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            try:
+                data = json.loads(line[len("data: "):])
+                parts = data["candidates"][0]["content"]["parts"]
+            except (KeyError, IndexError, json.JSONDecodeError):
+                continue
+            for part in parts:
+                text = part.get("text")
+                if text:
+                    yield text
+
+
+@app.post("/synthesize/stream")
+async def synthesize_stream(request: Request):
+    """Streaming variant of /synthesize: the analysis is forwarded token
+    by token over SSE, so the frontend can render text at first-token
+    latency instead of waiting out the full generation."""
+    body = _decode_body(await request.body(), _SYNTHESIZE_DECODER)
+    prompt = build_synthesis_prompt(body.profile, body.schemes, body.language)
+
+    # Same admission control as call_gemini: acquired here so saturation
+    # is a clean 429 before any SSE bytes go out; the slot is held for
+    # the life of the stream and released when the generator closes
+    # (including client disconnects).
+    await _acquire_gemini_slot()
+
+    async def gen():
+        streamed = False
+        try:
+            async for delta in _stream_gemini_text(prompt):
+                streamed = True
+                yield {"event": "token", "data": delta}
+        except httpx.HTTPError:
+            pass
+        finally:
+            _gemini_semaphore.release()
+        if not streamed:
+            fallback = FALLBACK_MESSAGES.get(body.language, FALLBACK_MESSAGES["en"])
+            yield {"event": "token", "data": fallback}
+        yield {"event": "done", "data": ""}
+
+    return EventSourceResponse(gen())
+
+
+if __name__ == "__main__":
+    # Multiple workers sidestep the GIL for CPU-bound scoring/serialization;
+    # uvloop + httptools shave per-request event-loop and HTTP parse overhead.
+    # WORKERS (from WEB_CONCURRENCY, parsed at the top of the module) also
+    # sized the per-process thread budget, so the two always agree.
+    # reload is incompatible with workers > 1, so it only kicks in when
+    # WEB_CONCURRENCY=1 is set explicitly for local development.
+    # LIMIT_CONCURRENCY caps connections per worker (503 beyond it); 0
+    # leaves uvicorn's default of unlimited.
+    enable_reload = os.environ.get("RELOAD", "0") == "1" and WORKERS == 1
+    limit_concurrency = int(os.environ.get("LIMIT_CONCURRENCY", "0")) or None
+    try:
+        uvicorn.run(
+            "app:app",
+            host="0.0.0.0",
+            port=PORT,
+            workers=WORKERS,
+            loop="uvloop",
+            http="httptools",
+            limit_concurrency=limit_concurrency,
+            reload=enable_reload,
+        )
+    except ValueError:
+        uvicorn.run("app:app", host="0.0.0.0", port=PORT, reload=False)